@@ -5,31 +5,732 @@ Multi-tenant support - One server serves multiple shops
 """
 
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 import os
-import json
+import hashlib
+import html
+import io
+import multiprocessing
+import orjson
 import time
 import re
 import threading
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class ORJSONProvider(DefaultJSONProvider):
+    """Serve all JSON (jsonify, request.get_json) through orjson"""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # Configuration
 MODELS_DIR = Path("/tmp/models")
 MODELS_DIR.mkdir(exist_ok=True)
 
-# Global storage for models (loaded on demand)
-loaded_models = {}
+# On-disk/in-memory embedding format: 'float32', 'float16' (2x smaller)
+# or 'int8' (per-row scale, 4x smaller)
+EMBEDDINGS_DTYPE = os.environ.get('EMBEDDINGS_DTYPE', 'float32')
+if EMBEDDINGS_DTYPE not in ('float32', 'float16', 'int8'):
+    raise ValueError(f"Unsupported EMBEDDINGS_DTYPE: {EMBEDDINGS_DTYPE}")
+
+# Neural shortlist passed on to fuzzy scoring and boosting:
+# max(MIN_CANDIDATES, limit * SHORTLIST_FACTOR) products
+MIN_CANDIDATES = 50
+SHORTLIST_FACTOR = 4
+
+# Product fields matched by the fuzzy scorer (score is the max over fields)
+FUZZY_FIELDS = ('name', 'model', 'description', 'category', 'season', 'gender')
+
+# rapidfuzz cdist threads (-1 = all cores). The default of 1 suits the ~50-string
+# shortlist, where starting a thread pool costs more than it saves.
+FUZZY_WORKERS = int(os.environ.get('FUZZY_WORKERS', 1))
+
+# Attributes matched against the query for boost_config weights
+BOOST_FIELDS = ('season', 'category', 'manufacturer', 'color', 'gender', 'fit', 'kind_of')
+
+# Season boost: (query keywords, stem looked for in the product's season)
+SEASON_KEYWORDS = (
+    (('καλοκαίρι', 'summer'), 'καλοκαιρ'),
+    (('χειμώνα', 'κρύο', 'winter'), 'χειμ'),
+    (('άνοιξη', 'spring'), 'ανοιξ'),
+    (('φθινόπωρο', 'autumn', 'fall'), 'φθιν'),
+)
+SEASON_KEYWORD_STEMS = {keyword: stem for keywords, stem in SEASON_KEYWORDS for keyword in keywords}
+
+# Boost attributes that match when the product's value occurs in the query
+KEYWORD_BOOST_FIELDS = ('category', 'manufacturer', 'color', 'gender', 'kind_of')
+
+# Product fields returned in search results (as documented in the README)
+RESULT_FIELDS = ('id', 'name', 'model', 'description', 'category', 'price', 'image', 'url')
+
+# Texts per forward pass when embedding a catalog
+ENCODE_BATCH_SIZE = 64
+
+# Sentence encoder: 'torch' (sentence-transformers) or 'onnx' (ONNX Runtime,
+# int8-quantized export produced by export_onnx.py)
+EMBEDDING_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+EMBEDDER_BACKEND = os.environ.get('EMBEDDER_BACKEND', 'torch')
+if EMBEDDER_BACKEND not in ('torch', 'onnx'):
+    raise ValueError(f"Unsupported EMBEDDER_BACKEND: {EMBEDDER_BACKEND}")
+ONNX_MODEL_DIR = Path(os.environ.get('ONNX_MODEL_DIR', 'onnx_model'))
+ONNX_MODEL_FILE = os.environ.get('ONNX_MODEL_FILE', 'model_quantized.onnx')
+# Intra-op threads per ONNX session: by default the cores are split between
+# the gunicorn workers (WEB_CONCURRENCY, 2 as in the Procfile) instead of
+# every worker getting a pool the size of the whole machine
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 2))
+ONNX_THREADS = int(os.environ.get('ONNX_THREADS', max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))
+
+# Token limit of the MiniLM model (matches sentence-transformers' max_seq_length)
+MAX_SEQ_LENGTH = 128
+
+# Rows upcast to float32 per block when scoring float16/int8 embeddings (keeps the block in cache)
+UPCAST_BLOCK_ROWS = 4096
+
+# Regex fallback for strip_html when selectolax is not installed
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+WHITESPACE_RE = re.compile(r'\s+')
+
+# LRU cache sizes for query embeddings and full search responses
+QUERY_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 1024
+
+# Searches with a larger (client-chosen) limit bypass the result and semantic
+# caches, so a cached entry never holds more than this many results
+CACHE_MAX_LIMIT = 50
+
+# Semantic shortlist cache: recent query embeddings; a new query whose embedding
+# is at least this similar to a recent one (same shop and shortlist size) reuses
+# its neural shortlist, then is scored and ranked with its own text
+SEMANTIC_CACHE_SIZE = 1024
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.98))
+# Smaller catalogs skip the tier: scanning them costs less than the lookup
+SEMANTIC_CACHE_MIN_PRODUCTS = 1000
+
+# Shops kept in memory at once (least recently searched are evicted)
+MAX_LOADED_MODELS = int(os.environ.get('MAX_LOADED_MODELS', 32))
+
+# Times load() re-reads a model whose .json and .npy were replaced mid-load
+MODEL_LOAD_ATTEMPTS = 3
+
+# Fixed pool of locks serializing cold shop loads (shop_id hashed onto a stripe)
+SHOP_LOCK_STRIPES = 64
+
+# Concurrent /search requests for a shop are coalesced into one batch of up to
+# SEARCH_BATCH_SIZE queries, collected for at most SEARCH_BATCH_WINDOW_MS
+# (SEARCH_BATCH_SIZE=1 disables batching)
+SEARCH_BATCH_SIZE = int(os.environ.get('SEARCH_BATCH_SIZE', 8))
+SEARCH_BATCH_WINDOW_MS = float(os.environ.get('SEARCH_BATCH_WINDOW_MS', 2))
 
 # Global variable to track training status
 training_status = {}
 
+# Background training runs in worker processes, so encoding never competes
+# with request threads for the GIL. Workers are spawned (not forked) to stay
+# clear of locks and torch threads inherited from the server process, and
+# exit after each job so their copy of the embedder is not kept resident.
+# At most TRAIN_QUEUE_SIZE jobs may be queued or running; more get a 429.
+TRAIN_WORKERS = int(os.environ.get('TRAIN_WORKERS', 1))
+TRAIN_QUEUE_SIZE = int(os.environ.get('TRAIN_QUEUE_SIZE', 8))
+
+def new_training_executor() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=TRAIN_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+        max_tasks_per_child=1
+    )
+
+# Each server process creates its own pool on first use (training_pool()),
+# never at import: a pool created in the gunicorn master (--preload) would be
+# inherited by every forked worker, all sharing its call and result pipes.
+training_executor = None
+training_executor_pid = None
+
+# Latest job per shop: a future resolved once its outcome has been recorded.
+# Reentrant, since a job finishing at once runs its callback in the submitting thread.
+training_jobs = {}
+training_lock = threading.RLock()
+
+# Upper bound for /training-status?wait=... long polling (seconds)
+MAX_STATUS_WAIT = 60
+
+# =============================================================================
+# Caching
+# =============================================================================
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping with a fixed capacity"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+    
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+# Global storage for models (loaded on demand, bounded LRU).
+# Evicted shops are reloaded cheaply from their memory-mapped .npy on next use.
+loaded_models = LRUCache(MAX_LOADED_MODELS)
+# Striped rather than one lock per shop_id, so unknown ids (404s) cost no memory
+shop_locks = [threading.Lock() for _ in range(SHOP_LOCK_STRIPES)]
+
+class SemanticCache:
+    """
+    Ring buffer of recent query embeddings and their neural shortlists.
+    
+    A lookup scores the new embedding against all stored rows with one matmul
+    and returns the value of the most similar row with the same context
+    (shop, generation, shortlist size) if it clears the threshold.
+    """
+    
+    def __init__(self, maxsize: int, threshold: float):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.embeddings = None
+        self.context_hashes = None
+        self.entries = [None] * maxsize  # (context, value)
+        self.size = 0
+        self.next = 0
+        self.lock = threading.Lock()
+    
+    def get(self, context, embedding):
+        import numpy as np
+        
+        with self.lock:
+            if self.size == 0:
+                return None
+            sims = self.embeddings[:self.size] @ embedding
+            sims[self.context_hashes[:self.size] != hash(context)] = -1.0
+            best = int(np.argmax(sims))
+            entry = self.entries[best]
+            if sims[best] >= self.threshold and entry[0] == context:
+                return entry[1]
+            return None
+    
+    def put(self, context, embedding, value) -> None:
+        import numpy as np
+        
+        with self.lock:
+            if self.embeddings is None:
+                self.embeddings = np.zeros((self.maxsize, len(embedding)), dtype=np.float32)
+                self.context_hashes = np.zeros(self.maxsize, dtype=np.int64)
+            slot = self.next
+            self.embeddings[slot] = embedding
+            self.context_hashes[slot] = hash(context)
+            self.entries[slot] = (context, value)
+            self.next = (slot + 1) % self.maxsize
+            self.size = min(self.size + 1, self.maxsize)
+
+# Result cache hits skip the transformer forward pass and the ranking entirely;
+# semantic hits skip scoring the whole catalog.
+# Query embeddings only depend on the text, so they are shared by all shops.
+query_embedding_cache = LRUCache(QUERY_CACHE_SIZE)
+search_results_cache = LRUCache(RESULT_CACHE_SIZE)
+semantic_cache = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD)
+
+# Search counters reported by /health
+search_stats = {'searches': 0, 'result_cache_hits': 0, 'semantic_cache_hits': 0, 'query_encodes': 0}
+stats_lock = threading.Lock()
+
+def count(stat: str) -> None:
+    with stats_lock:
+        search_stats[stat] += 1
+
+# Parsed model summaries for /status and /shops: path -> (mtime_ns, size, info)
+model_info_cache = {}
+
+def model_generation(st: os.stat_result) -> tuple:
+    """
+    Generation of a model, from a stat() of its JSON (replaced, so a new
+    inode and mtime, on every retrain). Part of every cache key, so a retrain
+    by any worker process invalidates cached queries, and engines of an older
+    generation are reloaded by get_engine().
+    """
+    return (st.st_ino, st.st_mtime_ns)
+
+def read_model_info(model_path: Path) -> Dict:
+    """
+    Return {'products_count', 'trained_at'} for a model file.
+    
+    Read from the small .meta sidecar written by train(); models saved before
+    sidecars existed fall back to parsing the full model file. Either is only
+    read again when the model's mtime or size changes (i.e. after a retrain);
+    otherwise this costs a single stat() call.
+    """
+    st = model_path.stat()
+    cached = model_info_cache.get(model_path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    
+    meta_path = model_path.with_suffix('.meta')
+    try:
+        if meta_path.stat().st_mtime_ns < st.st_mtime_ns:
+            raise FileNotFoundError(meta_path)  # stale sidecar
+        info = orjson.loads(meta_path.read_bytes())
+    except FileNotFoundError:
+        with open(model_path, 'rb') as f:
+            model_data = orjson.loads(f.read())
+        info = {
+            'products_count': len(model_data['products']),
+            'trained_at': model_data['trained_at']
+        }
+    model_info_cache[model_path] = (st.st_mtime_ns, st.st_size, info)
+    return info
+
+# =============================================================================
+# Embedder
+# =============================================================================
+
+class OnnxEmbedder:
+    """
+    ONNX Runtime drop-in for SentenceTransformer.encode (CPU).
+    
+    Runs the exported transformer, then mean-pools token embeddings with the
+    attention mask, exactly like the sentence-transformers pipeline. ORT
+    releases the GIL during inference, so request threads encode concurrently.
+    """
+    
+    def __init__(self, model_dir: Path, model_file: str):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.session = ort.InferenceSession(
+            str(model_dir / model_file),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+    
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False):
+        import numpy as np
+        
+        # Batch texts of similar length together so little compute is spent
+        # on padding tokens (as sentence-transformers does), then restore order
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        sorted_texts = [texts[i] for i in order]
+        
+        batches = []
+        for start in range(0, len(sorted_texts), batch_size):
+            tokens = self.tokenizer(
+                sorted_texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors='np'
+            )
+            feed = {name: value.astype(np.int64) for name, value in tokens.items() if name in self.input_names}
+            if 'token_type_ids' in self.input_names and 'token_type_ids' not in feed:
+                # XLM-R tokenizers emit none, BERT-style exports still require them
+                feed['token_type_ids'] = np.zeros_like(feed['input_ids'])
+            token_embeddings = self.session.run(None, feed)[0]
+            
+            # Mean pooling over real (non-padding) tokens
+            mask = tokens['attention_mask'][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            batches.append(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+        
+        embeddings = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(batches)
+        if normalize_embeddings:
+            embeddings = l2_normalize(embeddings)
+        return embeddings
+
+# One read-only model shared by every shop (loaded once per process)
+shared_embedder = None
+embedder_lock = threading.Lock()
+
+def load_torch_embedder():
+    """sentence-transformers model on GPU (fp16) if available, CPU (fp32) otherwise"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    logger.info(f"Loading sentence-transformers model on {device}...")
+    embedder = SentenceTransformer(EMBEDDING_MODEL, device=device)
+    if device == 'cuda':
+        # fp16 halves GPU memory and speeds up encode; CPU stays fp32
+        embedder.half()
+    return embedder
+
+def get_embedder():
+    """Return the process-wide sentence encoder, loading it on first use"""
+    global shared_embedder
+    
+    if shared_embedder is not None:
+        return shared_embedder
+    
+    with embedder_lock:
+        if shared_embedder is not None:
+            return shared_embedder
+        try:
+            if EMBEDDER_BACKEND == 'onnx':
+                logger.info(f"Loading ONNX model from {ONNX_MODEL_DIR / ONNX_MODEL_FILE}...")
+                embedder = OnnxEmbedder(ONNX_MODEL_DIR, ONNX_MODEL_FILE)
+            else:
+                embedder = load_torch_embedder()
+            # Publish only once fully initialised (readers check without the lock)
+            shared_embedder = embedder
+            logger.info("Model loaded successfully")
+        except Exception as e:
+            logger.error(f"Failed to load model: {e}")
+            raise
+    
+    return shared_embedder
+
+# =============================================================================
+# Vector Helpers
+# =============================================================================
+
+def l2_normalize(vectors):
+    """Return float32, C-contiguous, L2-normalized copy of vectors (1D or 2D)"""
+    import numpy as np
+    
+    vectors = np.array(vectors, dtype=np.float32, order='C')
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    vectors /= norms + 1e-12
+    return vectors
+
+@lru_cache(maxsize=None)
+def import_html_parser():
+    """Return selectolax's lexbor HTML parser if installed, None otherwise (regex fallback)"""
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser
+    except ImportError:
+        return None
+
+@lru_cache(maxsize=None)
+def import_lxml_etree():
+    """Return lxml's etree (C parser) if installed, None otherwise (ElementTree fallback)"""
+    try:
+        from lxml import etree
+        return etree
+    except ImportError:
+        return None
+
+@lru_cache(maxsize=None)
+def import_defused_iterparse():
+    """Return defusedxml's hardened ElementTree iterparse if installed, None otherwise (stdlib fallback)"""
+    try:
+        from defusedxml.ElementTree import iterparse
+        return iterparse
+    except ImportError:
+        return None
+
+@lru_cache(maxsize=None)
+def import_ahocorasick():
+    """Return the pyahocorasick module if installed, None otherwise (substring fallback)"""
+    try:
+        import ahocorasick
+        return ahocorasick
+    except ImportError:
+        return None
+
+def build_automaton(keywords: Dict[str, str]):
+    """Aho-Corasick automaton mapping each keyword to its value, or None without pyahocorasick/keywords"""
+    ahocorasick = import_ahocorasick()
+    if ahocorasick is None or not keywords:
+        return None
+    automaton = ahocorasick.Automaton()
+    for keyword, value in keywords.items():
+        automaton.add_word(keyword, value)
+    automaton.make_automaton()
+    return automaton
+
+def find_keywords(automaton, keywords: Dict[str, str], text: str) -> frozenset:
+    """Values of the keywords occurring in text: one automaton scan, or a substring test per keyword"""
+    if automaton is not None:
+        return frozenset(value for _, value in automaton.iter(text))
+    return frozenset(value for keyword, value in keywords.items() if keyword in text)
+
+@lru_cache(maxsize=None)
+def season_automaton():
+    return build_automaton(SEASON_KEYWORD_STEMS)
+
+@lru_cache(maxsize=None)
+def import_rank_kernel():
+    """
+    Numba-compiled top-k ranking kernel, or None when numba is not installed.
+    
+    One pass computes 0.7 * neural + 0.3 * fuzzy + boost per candidate and keeps
+    the k best in a min-heap: no temporary score arrays and O(n log k) ranking.
+    """
+    try:
+        import numpy as np
+        from numba import njit
+    except ImportError:
+        return None
+    
+    @njit(cache=True)
+    def rank_top_k(similarities, fuzzy_scores, boost, k):
+        heap_scores = np.empty(k, dtype=np.float32)
+        heap_positions = np.empty(k, dtype=np.int64)
+        size = 0
+        for i in range(len(similarities)):
+            score = np.float32(0.7) * similarities[i] + np.float32(0.3) * fuzzy_scores[i] + boost[i]
+            if size < k:
+                # Sift up the new leaf
+                j = size
+                size += 1
+                while j > 0:
+                    parent = (j - 1) // 2
+                    if heap_scores[parent] <= score:
+                        break
+                    heap_scores[j] = heap_scores[parent]
+                    heap_positions[j] = heap_positions[parent]
+                    j = parent
+            elif score > heap_scores[0]:
+                # Replace the smallest kept score and sift it down
+                j = 0
+                while True:
+                    child = 2 * j + 1
+                    if child >= k:
+                        break
+                    if child + 1 < k and heap_scores[child + 1] < heap_scores[child]:
+                        child += 1
+                    if heap_scores[child] >= score:
+                        break
+                    heap_scores[j] = heap_scores[child]
+                    heap_positions[j] = heap_positions[child]
+                    j = child
+            else:
+                continue
+            heap_scores[j] = score
+            heap_positions[j] = i
+        
+        order = np.argsort(-heap_scores[:size])
+        return heap_positions[:size][order], heap_scores[:size][order]
+    
+    return rank_top_k
+
+def rank_top_k(similarities, fuzzy_scores, boost, k: int):
+    """Positions and scores of the k best 0.7 * neural + 0.3 * fuzzy + boost scores, best first"""
+    import numpy as np
+    
+    k = min(k, len(similarities))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    
+    kernel = import_rank_kernel()
+    if kernel is not None:
+        return kernel(similarities, fuzzy_scores, boost, k)
+    
+    # NumPy fallback: scores combined in place (one temporary), then an O(n)
+    # partition and a sort of only the k winners
+    scores = similarities * np.float32(0.7)
+    scores += np.float32(0.3) * fuzzy_scores
+    scores += boost
+    top_positions = np.argpartition(-scores, k - 1)[:k]
+    top_positions = top_positions[np.argsort(-scores[top_positions])]
+    return top_positions, scores[top_positions]
+
+def warm_rank_kernel() -> None:
+    """Compile the Numba ranking kernel (if installed) now instead of on the first search"""
+    import numpy as np
+    
+    scores = np.zeros(2, dtype=np.float32)
+    rank_top_k(scores, scores, scores, 1)
+
+def quantize_int8(embeddings):
+    """Symmetric per-row int8 quantization, returns (int8 matrix, float32 row scales)"""
+    import numpy as np
+    
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.round(embeddings / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+def upcast_dot(embeddings, query, scales=None):
+    """
+    Dot product of float16 or int8 rows (times optional row scales) with a
+    float32 query vector, or a (dim, m) matrix of queries.
+    
+    NumPy has no BLAS GEMV for these types (float16/integer matmul falls back to
+    slow loops), so rows are upcast block by block and scored with sgemv while
+    still in cache. Only the compact matrix is streamed from RAM: a half
+    (float16) or a quarter (int8) of the float32 traffic.
+    """
+    import numpy as np
+    
+    similarities = np.empty((len(embeddings),) + query.shape[1:], dtype=np.float32)
+    for start in range(0, len(embeddings), UPCAST_BLOCK_ROWS):
+        stop = start + UPCAST_BLOCK_ROWS
+        np.dot(embeddings[start:stop].astype(np.float32), query, out=similarities[start:stop])
+    if scales is not None:
+        similarities *= scales[:, None] if similarities.ndim == 2 else scales
+    return similarities
+
+def write_atomically(path: Path, write) -> None:
+    """
+    Write a file through a temp file in the same directory, then os.replace()
+    it into place. Readers never see a partial file, and processes that still
+    have the old file memory-mapped keep its (unlinked) contents intact.
+    """
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+# =============================================================================
+# Packed Embeddings
+# =============================================================================
+
+# All shops' embeddings concatenated into one memory-mapped matrix, with a
+# manifest mapping shop_id -> rows. Built at startup by pack_embeddings().
+PACKED_MANIFEST_PATH = MODELS_DIR / "manifest.json"
+
+packed_store = None
+packed_lock = threading.Lock()
+
+def shop_embedding_files():
+    """Yield (shop_id, path) of per-shop embedding files (excluding scale sidecars)"""
+    for path in sorted(MODELS_DIR.glob("shop_*.npy")):
+        if not path.name.endswith('.scales.npy'):
+            yield path.stem.replace('shop_', '', 1), path
+
+def pack_embeddings() -> int:
+    """
+    Concatenate every shop's embeddings into one memory-mapped matrix.
+    
+    Each manifest entry records the source file's mtime/size; shops retrained
+    after packing fall back to their own .npy until the next pack, which
+    also compacts away their old rows. Returns the number of packed shops.
+    """
+    import numpy as np
+    
+    dtype = np.dtype(EMBEDDINGS_DTYPE)
+    sources = []
+    for shop_id, path in shop_embedding_files():
+        try:
+            # stat before reading: a concurrent retrain then shows up as a mismatch
+            st = path.stat()
+            embeddings = np.load(path, mmap_mode='r')
+        except Exception as e:
+            logger.error(f"Skipping embeddings of shop {shop_id} while packing: {e}")
+            continue
+        if embeddings.dtype == dtype and embeddings.ndim == 2:
+            sources.append((shop_id, st, embeddings))
+    
+    dim = sources[0][2].shape[1] if sources else 0
+    sources = [source for source in sources if source[2].shape[1] == dim]
+    if not sources:
+        return 0
+    
+    pack_id = time.time_ns()
+    embeddings_file = f"packed_{pack_id}.npy"
+    scales_file = f"packed_{pack_id}.scales.npy" if dtype == np.int8 else None
+    total = sum(len(embeddings) for _, _, embeddings in sources)
+    
+    # Filled under a temp name and renamed once complete
+    tmp_embeddings_path = MODELS_DIR / f"{embeddings_file}.tmp"
+    pack_paths = [tmp_embeddings_path, MODELS_DIR / embeddings_file]
+    if scales_file:
+        pack_paths.append(MODELS_DIR / scales_file)
+    
+    # Packing is only an optimization: on any failure (e.g. a full disk) the
+    # new pack is discarded and shops keep using their own .npy files
+    try:
+        packed = np.lib.format.open_memmap(tmp_embeddings_path, mode='w+', dtype=dtype, shape=(total, dim))
+        scales = np.empty(total, dtype=np.float32) if scales_file else None
+        manifest = {'embeddings_file': embeddings_file, 'scales_file': scales_file, 'shops': {}}
+        
+        start = 0
+        for shop_id, st, embeddings in sources:
+            stop = start + len(embeddings)
+            packed[start:stop] = embeddings
+            if scales is not None:
+                scales[start:stop] = np.load(MODELS_DIR / f"shop_{shop_id}.scales.npy")
+            manifest['shops'][shop_id] = {
+                'start': start,
+                'count': len(embeddings),
+                'mtime_ns': st.st_mtime_ns,
+                'size': st.st_size
+            }
+            start = stop
+        
+        packed.flush()
+        del packed
+        os.replace(tmp_embeddings_path, MODELS_DIR / embeddings_file)
+        if scales is not None:
+            write_atomically(MODELS_DIR / scales_file, lambda f: np.save(f, scales))
+        
+        # Switching the manifest is atomic
+        write_atomically(PACKED_MANIFEST_PATH, lambda f: f.write(orjson.dumps(manifest)))
+    except Exception as e:
+        logger.error(f"Packing embeddings failed, using per-shop files: {e}")
+        for path in pack_paths:
+            path.unlink(missing_ok=True)
+        return 0
+    
+    # Older packs (and leftovers of interrupted packs) are removed afterwards
+    for old in MODELS_DIR.glob("packed_*"):
+        if old.name not in (embeddings_file, scales_file):
+            old.unlink(missing_ok=True)
+    
+    global packed_store
+    with packed_lock:
+        packed_store = None
+    
+    logger.info(f"Packed embeddings of {len(sources)} shops ({total} rows) into {embeddings_file}")
+    return len(sources)
+
+def get_packed_store():
+    """Return (embeddings, scales, manifest) of the current pack, or None"""
+    import numpy as np
+    
+    global packed_store
+    
+    with packed_lock:
+        if packed_store is None and PACKED_MANIFEST_PATH.exists():
+            try:
+                manifest = orjson.loads(PACKED_MANIFEST_PATH.read_bytes())
+                embeddings = np.load(MODELS_DIR / manifest['embeddings_file'], mmap_mode='r')
+                scales = None
+                if manifest['scales_file']:
+                    scales = np.load(MODELS_DIR / manifest['scales_file'])
+                packed_store = (embeddings, scales, manifest)
+            except Exception as e:
+                logger.error(f"Error loading packed embeddings: {e}")
+        return packed_store
+
 # =============================================================================
 # Neural Search Engine
 # =============================================================================
@@ -39,32 +740,35 @@ class NeuralSearchEngine:
     
     def __init__(self, shop_id: str):
         self.shop_id = shop_id
+        self.generation = None  # set by load()
         self.model_path = MODELS_DIR / f"shop_{shop_id}.json"
-        self.embedder = None
+        self.meta_path = MODELS_DIR / f"shop_{shop_id}.meta"
+        self.embeddings_path = MODELS_DIR / f"shop_{shop_id}.npy"
+        self.scales_path = MODELS_DIR / f"shop_{shop_id}.scales.npy"
         self.products = []
         self.embeddings = None
+        self.scales = None
+        self.fuzzy_fields = {}
+        self.boost_fields = {}
+        self.fit_words = None
+        self.keywords = {}
+        self.keyword_automata = {}
         
-    def load_model(self):
-        """Load sentence transformer model (lazy loading)"""
-        if self.embedder is None:
-            try:
-                from sentence_transformers import SentenceTransformer
-                logger.info("Loading sentence-transformers model...")
-                self.embedder = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-                logger.info("Model loaded successfully")
-            except Exception as e:
-                logger.error(f"Failed to load model: {e}")
-                raise
-    
     def strip_html(self, text: str) -> str:
         """Remove HTML tags and clean whitespace"""
         if not text:
             return ''
-        # Remove HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
+        # Plain text (most fields): nothing to parse
+        if '<' not in text and '&' not in text:
+            return WHITESPACE_RE.sub(' ', text).strip()
+        # Remove HTML tags (selectolax also decodes entities and copes with malformed markup)
+        html_parser = import_html_parser()
+        if html_parser is not None:
+            text = html_parser(text).text()
+        else:
+            text = html.unescape(HTML_TAG_RE.sub('', text))
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
+        return WHITESPACE_RE.sub(' ', text).strip()
     
     def get_text(self, element, tag: str) -> str:
         """Safely extract and clean text from XML element"""
@@ -73,20 +777,79 @@ class NeuralSearchEngine:
             return self.strip_html(node.text)
         return ''
     
-    def train(self, xml_content: str) -> Dict:
-        """Train model from XML content"""
-        import xml.etree.ElementTree as ET
+    def iter_products(self, xml_content: Union[str, bytes, Path]):
+        """
+        Stream <product> elements from XML content (str/bytes) or an XML file path.
+        
+        Each product is cleared and detached from its parent once consumed,
+        so memory stays flat regardless of catalog size. Uses lxml when
+        installed (2-3x faster), the stdlib ElementTree otherwise.
+        
+        Feeds come from unauthenticated /train requests, so entities are never
+        resolved (no XXE file reads, no entity bombs): lxml skips DTDs and the
+        network, defusedxml rejects DTDs in the fallback.
+        """
+        etree = import_lxml_etree()
+        
+        if isinstance(xml_content, Path):
+            source = open(xml_content, 'rb')
+        elif isinstance(xml_content, bytes):
+            source = io.BytesIO(xml_content)
+        elif etree is not None:
+            # lxml parses bytes; the text is already decoded, so it is re-encoded as UTF-8
+            source = io.BytesIO(xml_content.encode('utf-8'))
+        else:
+            source = io.StringIO(xml_content)
+        
+        if etree is not None:
+            with source:
+                encoding = 'utf-8' if isinstance(xml_content, str) else None
+                for _, elem in etree.iterparse(source, tag='product', encoding=encoding, load_dtd=False,
+                                               resolve_entities=False, no_network=True):
+                    if elem.getparent() is None:
+                        continue
+                    yield elem
+                    # Drop the consumed product and any already processed siblings
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+            return
+        
+        iterparse = import_defused_iterparse()
+        if iterparse is None:
+            # The stdlib parser (expat) never fetches external entities
+            from xml.etree.ElementTree import iterparse
+        else:
+            iterparse = partial(iterparse, forbid_dtd=True)
+        
+        with source:
+            parents = []
+            for event, elem in iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    parents.append(elem)
+                    continue
+                
+                parents.pop()
+                if elem.tag == 'product' and parents:
+                    yield elem
+                    elem.clear()
+                    parents[-1].remove(elem)
+    
+    def train(self, xml_content: Union[str, bytes, Path]) -> Dict:
+        """
+        Train model from XML content (str/bytes) or an XML file path and write
+        it to disk. Runs in a training worker process; the server serves the
+        new model with load().
+        """
         from rapidfuzz import fuzz
         import numpy as np
         
-        self.load_model()
-        
         try:
-            # Parse XML
-            root = ET.fromstring(xml_content)
+            # Parse XML (streaming)
             products = []
+            search_texts = []
             
-            for product in root.findall('.//product'):
+            for product in self.iter_products(xml_content):
                 product_data = {
                     'id': self.get_text(product, 'id'),
                     'name': self.get_text(product, 'name'),
@@ -118,9 +881,9 @@ class NeuralSearchEngine:
                     product_data['manufacturer']
                 ]
                 
-                # Filter out empty strings and join
-                search_text = ' '.join(filter(None, search_text_parts))
-                product_data['search_text'] = search_text
+                # Filter out empty strings and join (only needed for embedding,
+                # so it is not stored with the product)
+                search_texts.append(' '.join(filter(None, search_text_parts)))
                 
                 products.append(product_data)
             
@@ -129,24 +892,27 @@ class NeuralSearchEngine:
             
             # Generate embeddings
             logger.info(f"Generating embeddings for {len(products)} products...")
-            search_texts = [p['search_text'] for p in products]
-            embeddings = self.embedder.encode(search_texts, convert_to_numpy=True, normalize_embeddings=True)
+            # Both backends sort texts by length internally, so each batch is
+            # padded only to its own longest text
+            embeddings = get_embedder().encode(
+                search_texts,
+                batch_size=ENCODE_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
             
+            # Normalized float32 rows: dot product == cosine, single SGEMV at search time
+            embeddings = l2_normalize(embeddings)
             logger.info(f"Embeddings normalized for cosine similarity")
             
-            # Save model
+            # Save model (products as JSON, embeddings as a separate .npy)
             model_data = {
                 'shop_id': self.shop_id,
                 'products': products,
-                'embeddings': embeddings.tolist(),
                 'trained_at': time.time()
             }
-            
-            with open(self.model_path, 'w', encoding='utf-8') as f:
-                json.dump(model_data, f, ensure_ascii=False, indent=2)
-            
-            self.products = products
-            self.embeddings = embeddings
+            self.save(model_data, embeddings)
             
             logger.info(f"Training complete for shop {self.shop_id}: {len(products)} products")
             
@@ -161,19 +927,210 @@ class NeuralSearchEngine:
             logger.error(f"Training error: {e}")
             return {'success': False, 'error': str(e)}
     
+    def save(self, model_data: Dict, embeddings) -> None:
+        """
+        Write embeddings to .npy and products/metadata to compact JSON.
+        
+        Every file is replaced atomically (never rewritten in place), since
+        live engines in this and other workers have the old files mmapped.
+        """
+        import numpy as np
+        
+        # Embeddings first, so an existing JSON always has its vectors on disk
+        if EMBEDDINGS_DTYPE == 'int8':
+            quantized, scales = quantize_int8(embeddings)
+            write_atomically(self.scales_path, lambda f: np.save(f, scales))
+            write_atomically(self.embeddings_path, lambda f: np.save(f, quantized))
+        else:
+            stored = embeddings.astype(EMBEDDINGS_DTYPE, copy=False)
+            write_atomically(self.embeddings_path, lambda f: np.save(f, stored))
+            self.scales_path.unlink(missing_ok=True)
+        
+        # The JSON records which .npy it was saved with, so load() can tell a
+        # matching pair from new vectors next to old products (or vice versa)
+        st = self.embeddings_path.stat()
+        model_data['embeddings_version'] = [st.st_mtime_ns, st.st_size]
+        
+        # Compact UTF-8 JSON via orjson (no indentation: smaller and faster to parse).
+        # The JSON and then the summary sidecar for /status and /shops are
+        # replaced last: they commit the new model, and the sidecar is never
+        # older than the model it describes
+        write_atomically(self.model_path, lambda f: f.write(orjson.dumps(model_data)))
+        write_atomically(self.meta_path, lambda f: f.write(orjson.dumps({
+            'products_count': len(model_data['products']),
+            'trained_at': model_data['trained_at']
+        })))
+    
+    def packed_embeddings(self, version=None):
+        """Return (embeddings, scales) rows of this shop in the packed matrix, if they are this version of the .npy (default: the current one)"""
+        store = get_packed_store()
+        if store is None:
+            return None
+        
+        embeddings, scales, manifest = store
+        entry = manifest['shops'].get(self.shop_id)
+        if entry is None:
+            return None
+        
+        if version is None:
+            st = self.embeddings_path.stat()
+            version = (st.st_mtime_ns, st.st_size)
+        if tuple(version) != (entry['mtime_ns'], entry['size']):
+            return None
+        
+        start, stop = entry['start'], entry['start'] + entry['count']
+        return embeddings[start:stop], (scales[start:stop] if scales is not None else None)
+    
+    def load_embeddings(self, version=None) -> bool:
+        """
+        Memory-map embeddings from disk: no float parsing, pages are loaded on demand.
+        
+        Returns False when the .npy is not the given version (the one the
+        model JSON was saved with), i.e. it was replaced by a retrain mid-load.
+        """
+        import numpy as np
+        
+        packed = self.packed_embeddings(version)
+        if packed is not None:
+            # Zero-copy view into the shared packed matrix
+            embeddings, scales = packed
+        else:
+            embeddings = np.load(self.embeddings_path, mmap_mode='r')
+            scales = np.load(self.scales_path) if embeddings.dtype == np.int8 else None
+            if version is not None:
+                # Checked after mapping: the JSON was read first, so a match
+                # means the mapped file is the one the JSON describes
+                st = self.embeddings_path.stat()
+                if [st.st_mtime_ns, st.st_size] != list(version):
+                    return False
+        
+        if embeddings.dtype in (np.float16, np.int8):
+            # Kept compact, upcast per block when scoring
+            self.embeddings = embeddings
+        else:
+            # Files written by train() are already float32 C-order, so this is a no-op view
+            self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.scales = scales
+        return True
+    
+    def prepare_fields(self) -> None:
+        """Lowercase the fuzzy-matched and boosted fields once instead of on every search"""
+        import numpy as np
+        
+        # Object arrays so the candidate strings are gathered by fancy indexing
+        lowered = {
+            field: np.array([(product.get(field) or '').lower() for product in self.products], dtype=object)
+            for field in set(FUZZY_FIELDS) | set(BOOST_FIELDS)
+        }
+        self.fuzzy_fields = {field: lowered[field] for field in FUZZY_FIELDS}
+        self.boost_fields = {field: lowered[field] for field in BOOST_FIELDS}
+        
+        # Fit boosts when any of its words occurs in the query
+        self.fit_words = np.empty(len(self.products), dtype=object)
+        self.fit_words[:] = [frozenset(fit.split()) for fit in lowered['fit']]
+        
+        # Distinct attribute values (fit: words) per boost field, found in a
+        # query with one Aho-Corasick scan when pyahocorasick is installed
+        vocabularies = {field: set(lowered[field]) - {''} for field in KEYWORD_BOOST_FIELDS}
+        vocabularies['fit'] = frozenset().union(*self.fit_words)
+        self.keywords = {field: {value: value for value in values} for field, values in vocabularies.items()}
+        self.keyword_automata = {field: build_automaton(keywords) for field, keywords in self.keywords.items()}
+    
+    def query_terms(self, query: str, boost_config: Dict) -> Dict:
+        """
+        Lowercased query plus the season stems and attribute values it contains,
+        computed once per query and shared by the fuzzy matcher and every
+        candidate's boost.
+        """
+        query_lower = query.lower()
+        terms = {'lower': query_lower, 'season_stems': (), 'matched': {}}
+        
+        if boost_config.get('season', 0) > 0:
+            # Stems of the seasons mentioned in the query
+            found = find_keywords(season_automaton(), SEASON_KEYWORD_STEMS, query_lower)
+            terms['season_stems'] = tuple(stem for _, stem in SEASON_KEYWORDS if stem in found)
+        
+        for field, keywords in self.keywords.items():
+            if boost_config.get(field, 0) <= 0:
+                continue
+            automaton = self.keyword_automata[field]
+            # Without an automaton, attribute values are tested per candidate
+            # instead (fewer tests than the whole vocabulary); fit words always
+            # come from the vocabulary
+            if automaton is not None or field == 'fit':
+                terms['matched'][field] = find_keywords(automaton, keywords, query_lower)
+        
+        return terms
+    
+    def boost_scores(self, terms: Dict, candidates, boost_config: Dict):
+        """Sum of boost_config weights for the attributes each candidate matches in the query"""
+        import numpy as np
+        
+        query_lower = terms['lower']
+        
+        n = len(candidates)
+        boost = np.zeros(n, dtype=np.float32)
+        
+        for field in BOOST_FIELDS:
+            weight = boost_config.get(field, 0)
+            if weight <= 0:
+                continue
+            
+            values = self.boost_fields[field][candidates]
+            if field == 'season':
+                stems = terms['season_stems']
+                if not stems:
+                    continue
+                mask = np.fromiter((any(stem in v for stem in stems) for v in values), dtype=bool, count=n)
+            elif field in terms['matched']:
+                matched = terms['matched'][field]
+                if not matched:
+                    continue
+                if field == 'fit':
+                    mask = np.fromiter(
+                        (not matched.isdisjoint(words) for words in self.fit_words[candidates]),
+                        dtype=bool, count=n
+                    )
+                else:
+                    mask = np.fromiter((v in matched for v in values), dtype=bool, count=n)
+            else:
+                mask = np.fromiter((bool(v) and v in query_lower for v in values), dtype=bool, count=n)
+            
+            np.add(boost, weight, out=boost, where=mask)
+        
+        return boost
+    
     def load(self) -> bool:
         """Load trained model from disk"""
         if not self.model_path.exists():
             return False
         
         try:
-            import numpy as np
-            
-            with open(self.model_path, 'r', encoding='utf-8') as f:
-                model_data = json.load(f)
+            for attempt in range(MODEL_LOAD_ATTEMPTS):
+                with open(self.model_path, 'rb') as f:
+                    self.generation = model_generation(os.fstat(f.fileno()))
+                    model_data = orjson.loads(f.read())
+                
+                self.products = model_data['products']
+                
+                if 'embeddings' in model_data:
+                    # Legacy format with embeddings inlined in the JSON: migrate to .npy
+                    logger.info(f"Migrating legacy model for shop {self.shop_id} to .npy embeddings")
+                    embeddings = l2_normalize(model_data.pop('embeddings'))
+                    self.save(model_data, embeddings)
+                
+                # A retrain may replace the files between reading the JSON and
+                # mapping the .npy: re-read both until they belong together
+                if (self.load_embeddings(model_data.get('embeddings_version'))
+                        and len(self.embeddings) == len(self.products)):
+                    break
+                logger.warning(f"Model files of shop {self.shop_id} changed while loading, retrying")
+                time.sleep(0.05)
+            else:
+                logger.error(f"Model files of shop {self.shop_id} do not match, not loading it")
+                return False
             
-            self.products = model_data['products']
-            self.embeddings = np.array(model_data['embeddings'])
+            self.prepare_fields()
             
             logger.info(f"Loaded model for shop {self.shop_id}: {len(self.products)} products")
             return True
@@ -182,6 +1139,119 @@ class NeuralSearchEngine:
             logger.error(f"Error loading model: {e}")
             return False
     
+    def similarities(self, query_embeddings):
+        """Cosine similarities (products x queries) of normalized queries against all product embeddings"""
+        import numpy as np
+        
+        if self.embeddings.dtype != np.float32:
+            return upcast_dot(self.embeddings, query_embeddings.T, self.scales)
+        # float32 matrix @ float32 matrix dispatches to a single BLAS sgemm,
+        # streaming the embeddings from RAM once for all queries
+        return self.embeddings @ query_embeddings.T
+    
+    def encode_queries(self, queries: List[str]):
+        """Normalized query embeddings (one row per query); cache misses are encoded in one batch"""
+        import numpy as np
+        
+        queries = [query.strip() for query in queries]
+        embeddings = [query_embedding_cache.get(query) for query in queries]
+        
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        if missing:
+            # Query embeddings are normalized, stored embeddings are already normalized from training
+            encoded = dict(zip(missing, l2_normalize(
+                get_embedder().encode(missing, convert_to_numpy=True, normalize_embeddings=True)
+            )))
+            for query, embedding in encoded.items():
+                query_embedding_cache.put(query, embedding)
+                count('query_encodes')
+            embeddings = [encoded[query] if embedding is None else embedding
+                          for query, embedding in zip(queries, embeddings)]
+        
+        return np.stack(embeddings)
+    
+    def shortlist_size(self, limit: int) -> int:
+        """Neural candidates passed on to fuzzy scoring and boosting for a result limit"""
+        return min(len(self.products), max(MIN_CANDIDATES, limit * SHORTLIST_FACTOR))
+    
+    def candidate_similarities(self, candidates, query_embedding):
+        """Cosine similarities of one normalized query against the given products only"""
+        import numpy as np
+        
+        rows = self.embeddings[candidates]
+        if rows.dtype != np.float32:
+            scales = self.scales[candidates] if self.scales is not None else None
+            return upcast_dot(rows, query_embedding, scales)
+        return rows @ query_embedding
+    
+    def neural_candidates(self, query_embeddings, ks: List[int]):
+        """
+        Return (product indices, cosine similarities) of the neural shortlist
+        of each query, k products for each.
+        
+        Only the shortlist is scored by the (much slower) fuzzy matcher and
+        boosting, so their cost no longer grows with the catalog size.
+        """
+        import numpy as np
+        
+        similarities = self.similarities(query_embeddings)
+        shortlists = []
+        for k, column in zip(ks, similarities.T):
+            if k < len(column):
+                candidates = np.argpartition(-column, k - 1)[:k]
+            else:
+                candidates = np.arange(len(column))
+            shortlists.append((candidates, column[candidates]))
+        return shortlists
+    
+    def rank_candidates(self, query: str, candidates, similarities, limit: int,
+                        boost_config: Dict, min_threshold: float) -> List[Dict]:
+        """Fuzzy-score and boost a query's neural shortlist, returning the top results"""
+        from rapidfuzz import fuzz, process
+        import numpy as np
+        
+        # Fuzzy search scores (candidates only): one C-level cdist per field,
+        # which releases the GIL, folded into a running max over fields
+        terms = self.query_terms(query, boost_config)
+        fuzzy_scores = None
+        for field in FUZZY_FIELDS:
+            field_scores = process.cdist(
+                [terms['lower']],
+                self.fuzzy_fields[field][candidates],
+                scorer=fuzz.partial_ratio,
+                dtype=np.float32,
+                workers=FUZZY_WORKERS
+            )[0]
+            if fuzzy_scores is None:
+                fuzzy_scores = field_scores
+            else:
+                np.maximum(fuzzy_scores, field_scores, out=fuzzy_scores)
+        fuzzy_scores /= 100.0
+        
+        # APPLY BOOSTING based on attribute matches
+        boost = self.boost_scores(terms, candidates, boost_config)
+        
+        # Combine scores (70% neural, 30% fuzzy) plus boost, and take the top-k
+        # (positions within candidates)
+        top_positions, top_scores = rank_top_k(similarities, fuzzy_scores, boost, limit)
+        
+        # APPLY THRESHOLD FILTER
+        if min_threshold > 0:
+            keep = top_scores >= min_threshold
+            top_positions, top_scores = top_positions[keep], top_scores[keep]
+        
+        results = []
+        for pos, score in zip(top_positions, top_scores):
+            product = self.products[candidates[pos]]
+            result = {field: product.get(field) for field in RESULT_FIELDS}
+            result['score'] = float(score)
+            result['base_score'] = float(0.7 * similarities[pos] + 0.3 * fuzzy_scores[pos])
+            result['neural_score'] = float(similarities[pos])
+            result['fuzzy_score'] = float(fuzzy_scores[pos])
+            results.append(result)
+        
+        return results
+    
     def search(self, query: str, limit: int = 5, boost_config: Dict = None, min_threshold: float = 0.0) -> List[Dict]:
         """
         Search products using neural + fuzzy approach with configurable boosting
@@ -192,179 +1262,311 @@ class NeuralSearchEngine:
             boost_config: Dict with boost weights e.g. {'season': 0.15, 'category': 0.10}
             min_threshold: Minimum score threshold (0.0 - 1.0)
         """
-        from rapidfuzz import fuzz
-        import numpy as np
+        return self.search_batch([(query, limit, boost_config, min_threshold)])[0]
+    
+    def result_cache_key(self, query: str, limit: int, boost_config: Dict, min_threshold: float) -> tuple:
+        """Key of a search in search_results_cache"""
+        return (
+            query, self.shop_id, self.generation, limit,
+            tuple(sorted((boost_config or {}).items())), min_threshold
+        )
+    
+    def search_batch(self, searches: List[tuple]) -> List[List[Dict]]:
+        """
+        Run several searches together: (query, limit, boost_config, min_threshold) each.
         
+        Uncached queries are encoded in one forward pass and scored against the
+        embeddings with one matrix product; results are returned in input order.
+        """
         if not self.products:
             if not self.load():
-                return []
-        
-        self.load_model()
+                return [[] for _ in searches]
         
-        # Default boost config
-        if boost_config is None:
-            boost_config = {}
+        results = [None] * len(searches)
         
         try:
-            # Neural search with cosine similarity
-            # Query embedding is normalized, stored embeddings are already normalized from training
-            query_embedding = self.embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True)[0]
-            similarities = np.dot(self.embeddings, query_embedding)
-            
-            # Fuzzy search scores
-            fuzzy_scores = []
-            for product in self.products:
-                score = max(
-                    fuzz.partial_ratio(query.lower(), (product.get('name') or '').lower()),
-                    fuzz.partial_ratio(query.lower(), (product.get('model') or '').lower()),
-                    fuzz.partial_ratio(query.lower(), (product.get('description') or '').lower()),
-                    fuzz.partial_ratio(query.lower(), (product.get('category') or '').lower()),
-                    fuzz.partial_ratio(query.lower(), (product.get('season') or '').lower()),
-                    fuzz.partial_ratio(query.lower(), (product.get('gender') or '').lower())
-                ) / 100.0
-                fuzzy_scores.append(score)
-            
-            # Combine scores (70% neural, 30% fuzzy)
-            combined_scores = 0.7 * similarities + 0.3 * np.array(fuzzy_scores)
+            pending = []
+            for i, search in enumerate(searches):
+                count('searches')
+                cache_key = self.result_cache_key(*search) if search[1] <= CACHE_MAX_LIMIT else None
+                cached = search_results_cache.get(cache_key) if cache_key is not None else None
+                if cached is not None:
+                    count('result_cache_hits')
+                    results[i] = cached
+                else:
+                    pending.append((i, cache_key))
             
-            # APPLY BOOSTING based on attribute matches
-            query_lower = query.lower()
-            boosted_scores = combined_scores.copy()
-            
-            for idx, product in enumerate(self.products):
-                boost = 0.0
-                
-                # Season boost
-                if boost_config.get('season', 0) > 0:
-                    season = (product.get('season') or '').lower()
-                    if season:
-                        # Check for seasonal keywords in query
-                        if ('καλοκαίρι' in query_lower or 'summer' in query_lower) and 'καλοκαιρ' in season:
-                            boost += boost_config['season']
-                        elif ('χειμώνα' in query_lower or 'κρύο' in query_lower or 'winter' in query_lower) and 'χειμ' in season:
-                            boost += boost_config['season']
-                        elif ('άνοιξη' in query_lower or 'spring' in query_lower) and 'ανοιξ' in season:
-                            boost += boost_config['season']
-                        elif ('φθινόπωρο' in query_lower or 'autumn' in query_lower or 'fall' in query_lower) and 'φθιν' in season:
-                            boost += boost_config['season']
-                
-                # Category boost
-                if boost_config.get('category', 0) > 0:
-                    category = (product.get('category') or '').lower()
-                    if category and category in query_lower:
-                        boost += boost_config['category']
-                
-                # Manufacturer boost
-                if boost_config.get('manufacturer', 0) > 0:
-                    manufacturer = (product.get('manufacturer') or '').lower()
-                    if manufacturer and manufacturer in query_lower:
-                        boost += boost_config['manufacturer']
-                
-                # Color boost
-                if boost_config.get('color', 0) > 0:
-                    color = (product.get('color') or '').lower()
-                    if color and color in query_lower:
-                        boost += boost_config['color']
-                
-                # Gender boost
-                if boost_config.get('gender', 0) > 0:
-                    gender = (product.get('gender') or '').lower()
-                    if gender and gender in query_lower:
-                        boost += boost_config['gender']
-                
-                # Fit boost
-                if boost_config.get('fit', 0) > 0:
-                    fit = (product.get('fit') or '').lower()
-                    if fit and any(word in query_lower for word in fit.split()):
-                        boost += boost_config['fit']
-                
-                # Kind_of boost
-                if boost_config.get('kind_of', 0) > 0:
-                    kind_of = (product.get('kind_of') or '').lower()
-                    if kind_of and kind_of in query_lower:
-                        boost += boost_config['kind_of']
-                
-                boosted_scores[idx] += boost
+            if not pending:
+                return results
             
-            # Sort by boosted scores
-            sorted_indices = np.argsort(boosted_scores)[::-1]
+            # Neural search with cosine similarity
+            query_embeddings = self.encode_queries([searches[i][0] for i, _ in pending])
+            ks = [self.shortlist_size(searches[i][1]) for i, _ in pending]
+            # Only a shortlist smaller than a large catalog is worth caching
+            semantic = len(self.products) >= SEMANTIC_CACHE_MIN_PRODUCTS
+            contexts = [(self.shop_id, self.generation, k) if semantic and cache_key is not None and k < len(self.products)
+                        else None for (_, cache_key), k in zip(pending, ks)]
             
-            # APPLY THRESHOLD FILTER
-            if min_threshold > 0:
-                filtered_indices = [i for i in sorted_indices if boosted_scores[i] >= min_threshold]
-            else:
-                filtered_indices = sorted_indices
+            shortlists = [None] * len(pending)
+            misses = []
+            for j, (context, query_embedding) in enumerate(zip(contexts, query_embeddings)):
+                # Near-duplicate of a recent query (e.g. "τζιν μαύρο" / "μαύρο τζιν"):
+                # reuse its shortlist, but score it with this query's own embedding
+                candidates = semantic_cache.get(context, query_embedding) if context is not None else None
+                if candidates is not None and candidates.max() < len(self.products):
+                    count('semantic_cache_hits')
+                    shortlists[j] = (candidates, self.candidate_similarities(candidates, query_embedding))
+                else:
+                    misses.append(j)
             
-            # Get top results up to limit
-            top_indices = filtered_indices[:limit]
+            if misses:
+                found = self.neural_candidates(query_embeddings[misses], [ks[j] for j in misses])
+                for j, shortlist in zip(misses, found):
+                    if contexts[j] is not None:
+                        semantic_cache.put(contexts[j], query_embeddings[j], shortlist[0])
+                    shortlists[j] = shortlist
             
-            results = []
-            for idx in top_indices:
-                product = self.products[idx].copy()
-                product['score'] = float(boosted_scores[idx])
-                product['base_score'] = float(combined_scores[idx])
-                product['neural_score'] = float(similarities[idx])
-                product['fuzzy_score'] = float(fuzzy_scores[idx])
-                results.append(product)
+            # Fuzzy scores and boosts always come from the query's own text
+            for (i, cache_key), (candidates, similarities) in zip(pending, shortlists):
+                query, limit, boost_config, min_threshold = searches[i]
+                ranked = self.rank_candidates(query, candidates, similarities, limit, boost_config or {}, min_threshold)
+                if cache_key is not None:
+                    search_results_cache.put(cache_key, ranked)
+                results[i] = ranked
             
             return results
             
         except Exception as e:
             logger.error(f"Search error: {e}")
-            return []
+            return [result if result is not None else [] for result in results]
 
 # =============================================================================
-# Background Training
+# Model Registry
 # =============================================================================
 
-def background_train(shop_id: str, xml_content: str):
-    """Background training task"""
-    try:
-        logger.info(f"Background training started for shop {shop_id}")
+def get_engine(shop_id: str) -> Optional[NeuralSearchEngine]:
+    """
+    Return the loaded engine for a shop, loading it from disk on first use.
+    
+    Loading happens under the shop's lock stripe: concurrent first requests
+    for a cold shop wait for a single load instead of each loading their own
+    copy, while requests for shops on other stripes are not blocked.
+    
+    An engine whose generation differs from the model on disk (retrained by
+    this or another worker process) is treated as stale and reloaded; this
+    costs one stat() per call.
+    """
+    model_path = MODELS_DIR / f"shop_{shop_id}.json"
+    
+    def current(engine) -> bool:
+        try:
+            return engine is not None and engine.generation == model_generation(model_path.stat())
+        except FileNotFoundError:
+            return False
+    
+    engine = loaded_models.get(shop_id)
+    if current(engine):
+        return engine
+    
+    with shop_locks[hash(shop_id) % SHOP_LOCK_STRIPES]:
+        engine = loaded_models.get(shop_id)
+        if current(engine):
+            return engine
         
         engine = NeuralSearchEngine(shop_id)
-        result = engine.train(xml_content)
+        if not engine.load():
+            return None
         
-        if result['success']:
-            # Cache the trained model
-            loaded_models[shop_id] = engine
-            
-            training_status[shop_id] = {
-                'status': 'completed',
-                'completed_at': time.time(),
-                'products_count': result['products_count'],
-                'message': 'Training completed successfully'
-            }
-            logger.info(f"Background training completed for shop {shop_id}")
-        else:
-            training_status[shop_id] = {
-                'status': 'failed',
-                'completed_at': time.time(),
-                'error': result.get('error', 'Unknown error'),
-                'message': 'Training failed'
-            }
-            logger.error(f"Background training failed for shop {shop_id}: {result.get('error')}")
+        loaded_models.put(shop_id, engine)
+        return engine
+
+def warm_models() -> int:
+    """
+    Load the most recently trained shops (up to MAX_LOADED_MODELS) ahead of
+    the first searches. Run before gunicorn forks workers (--preload), the
+    loaded models are shared copy-on-write. Returns the number loaded.
+    """
+    model_files = sorted(MODELS_DIR.glob("shop_*.json"), key=lambda path: path.stat().st_mtime_ns, reverse=True)
+    
+    loaded = 0
+    for model_file in model_files[:MAX_LOADED_MODELS]:
+        shop_id = model_file.stem.replace('shop_', '', 1)
+        if shop_id.isalnum() and get_engine(shop_id) is not None:
+            loaded += 1
+    
+    logger.info(f"Warmed up {loaded} shop models")
+    return loaded
+
+# =============================================================================
+# Query Batching
+# =============================================================================
+
+class QueryBatcher:
+    """
+    Coalesces concurrent searches of the same shop into one search_batch() call.
+    
+    The first waiting request becomes the batch leader. A lone request runs
+    at once; otherwise the leader collects requests for up to `window`
+    seconds (or until `max_batch` are queued), runs them together, and hands
+    every request its results. One encoder call and one sgemm then serve the
+    whole batch instead of one pass per request. Requests arriving while a
+    batch runs queue up for the next one.
+    """
+    
+    def __init__(self, max_batch: int, window: float):
+        self.max_batch = max_batch
+        self.window = window
+        self.condition = threading.Condition()
+        self.pending = defaultdict(deque)  # shop_id -> queued requests
+        self.leaders = set()               # shops with a batch in progress
+    
+    def search(self, engine: NeuralSearchEngine, query: str, limit: int,
+               boost_config: Dict, min_threshold: float) -> List[Dict]:
+        if self.max_batch <= 1 or search_results_cache.get(
+                engine.result_cache_key(query, limit, boost_config, min_threshold)) is not None:
+            # Exact repeats are answered from the results cache without joining a batch
+            return engine.search(query, limit, boost_config, min_threshold)
+        
+        shop_id = engine.shop_id
+        item = {'search': (query, limit, boost_config, min_threshold), 'done': False, 'results': None}
+        
+        with self.condition:
+            self.pending[shop_id].append(item)
+            self.condition.notify_all()
+        
+        while True:
+            with self.condition:
+                while not item['done'] and shop_id in self.leaders:
+                    self.condition.wait()
+                if item['done']:
+                    return item['results']
+                
+                # No batch in progress for this shop: lead the next one
+                self.leaders.add(shop_id)
+                queue = self.pending[shop_id]
+                deadline = time.monotonic() + self.window
+                while 1 < len(queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = [queue.popleft() for _ in range(min(self.max_batch, len(queue)))]
+                if not queue:
+                    del self.pending[shop_id]
             
+            results = [[] for _ in batch]
+            try:
+                results = engine.search_batch([queued['search'] for queued in batch])
+            finally:
+                with self.condition:
+                    for queued, queued_results in zip(batch, results):
+                        queued['results'] = queued_results
+                        queued['done'] = True
+                    self.leaders.discard(shop_id)
+                    self.condition.notify_all()
+
+query_batcher = QueryBatcher(SEARCH_BATCH_SIZE, SEARCH_BATCH_WINDOW_MS / 1000.0)
+
+# =============================================================================
+# Background Training
+# =============================================================================
+
+def train_shop(shop_id: str, xml_content: Union[str, Path]) -> Dict:
+    """Train a shop's model and write it to disk (runs in a training worker process)"""
+    logger.info(f"Background training started for shop {shop_id}")
+    return NeuralSearchEngine(shop_id).train(xml_content)
+
+def finish_training(shop_id: str, xml_content: Union[str, Path], job_id: str, job: Future, future: Future):
+    """Record a training job's outcome and start serving the new model (runs in the server process)"""
+    try:
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        
+        if result['success']:
+            # The worker only wrote the model files; load them here
+            engine = NeuralSearchEngine(shop_id)
+            if not engine.load():
+                result = {'success': False, 'error': 'Trained model could not be loaded'}
+        
+        with training_lock:
+            if result['success']:
+                # Cache the trained model (its new generation invalidates
+                # cached queries for the old one)
+                loaded_models.put(shop_id, engine)
+                
+                training_status[shop_id] = {
+                    'status': 'completed',
+                    'job_id': job_id,
+                    'completed_at': time.time(),
+                    'products_count': result['products_count'],
+                    'message': 'Training completed successfully'
+                }
+                logger.info(f"Background training completed for shop {shop_id}")
+            else:
+                training_status[shop_id] = {
+                    'status': 'failed',
+                    'job_id': job_id,
+                    'completed_at': time.time(),
+                    'error': result.get('error', 'Unknown error'),
+                    'message': 'Training failed'
+                }
+                logger.error(f"Background training failed for shop {shop_id}: {result.get('error')}")
+    
     except Exception as e:
         logger.error(f"Background training error for shop {shop_id}: {e}")
-        training_status[shop_id] = {
-            'status': 'failed',
-            'completed_at': time.time(),
-            'error': str(e),
-            'message': 'Training failed'
-        }
+    finally:
+        if isinstance(xml_content, Path):
+            xml_content.unlink(missing_ok=True)
+        job.set_result(None)
+
+def training_pool() -> ProcessPoolExecutor:
+    """This process's training pool, created on first use (call under training_lock)"""
+    global training_executor, training_executor_pid
+    
+    # A pool owned by another pid was inherited through fork and is never used
+    if training_executor is None or training_executor_pid != os.getpid():
+        training_executor = new_training_executor()
+        training_executor_pid = os.getpid()
+    return training_executor
+
+def submit_training(shop_id: str, xml_content: Union[str, Path], job_id: str) -> Future:
+    """Queue a training job; the returned future completes once its outcome is recorded"""
+    global training_executor
+    
+    try:
+        future = training_pool().submit(train_shop, shop_id, xml_content)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for running out of memory): start a fresh pool
+        logger.warning("Training pool is broken, restarting it")
+        training_executor = None
+        future = training_pool().submit(train_shop, shop_id, xml_content)
+    
+    job = Future()
+    future.add_done_callback(lambda done: finish_training(shop_id, xml_content, job_id, job, done))
+    return job
 
 # =============================================================================
 # API Endpoints
 # =============================================================================
 
+def not_modified(etag: str):
+    """304 response when the client's If-None-Match already holds this (weak) ETag, None otherwise"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'service': 'neural-search-api',
-        'version': '2.1.0'
+        'version': '2.1.0',
+        'search_stats': dict(search_stats)
     })
 
 @app.route('/search', methods=['GET'])
@@ -414,19 +1616,15 @@ def search():
     
     try:
         # Get or create engine for this shop
-        if shop_id not in loaded_models:
-            engine = NeuralSearchEngine(shop_id)
-            if not engine.load():
-                return jsonify({
-                    'error': 'Model not trained for this shop',
-                    'shop_id': shop_id
-                }), 404
-            loaded_models[shop_id] = engine
-        else:
-            engine = loaded_models[shop_id]
+        engine = get_engine(shop_id)
+        if engine is None:
+            return jsonify({
+                'error': 'Model not trained for this shop',
+                'shop_id': shop_id
+            }), 404
         
-        # Search with boosting
-        results = engine.search(query, limit, boost_config, min_threshold)
+        # Search with boosting (batched with concurrent searches of this shop)
+        results = query_batcher.search(engine, query, limit, boost_config, min_threshold)
         
         return jsonify({
             'success': True,
@@ -446,21 +1644,32 @@ def search():
 def train():
     """
     Train model for a shop (async)
-    Returns immediately, training happens in background
+    Returns 202 immediately, training happens in a background worker process
+    (429 when the training queue is full).
+    Poll /training-status (optionally with wait=<seconds>) for the outcome.
     
     POST body (JSON):
         {
             "shop_id": "shop1",
             "xml": "<products>...</products>"
         }
-    """
-    data = request.get_json()
     
-    if not data:
-        return jsonify({'error': 'JSON body required'}), 400
+    or multipart/form-data with a "shop_id" field and an "xml" file upload,
+    which is streamed to disk instead of being decoded as one JSON string.
+    """
+    upload = request.files.get('xml')
     
-    shop_id = data.get('shop_id')
-    xml_content = data.get('xml')
+    if upload is not None:
+        shop_id = request.form.get('shop_id')
+        xml_content = upload
+    else:
+        data = request.get_json(silent=True)
+        
+        if not data:
+            return jsonify({'error': 'JSON body required'}), 400
+        
+        shop_id = data.get('shop_id')
+        xml_content = data.get('xml')
     
     if not shop_id:
         return jsonify({'error': 'shop_id is required'}), 400
@@ -472,20 +1681,61 @@ def train():
     if not shop_id.isalnum():
         return jsonify({'error': 'Invalid shop_id'}), 400
     
-    # Set status to "training"
-    training_status[shop_id] = {
-        'status': 'training',
-        'started_at': time.time(),
-        'message': 'Training in progress...'
-    }
+    job_id = uuid.uuid4().hex
     
-    # Start training in background thread
-    thread = threading.Thread(
-        target=background_train,
-        args=(shop_id, xml_content)
-    )
-    thread.daemon = True
-    thread.start()
+    if upload is not None:
+        # Parsed from disk by the worker, removed once training finishes.
+        # Saved before taking training_lock, so a large (or failing) upload
+        # never blocks other shops.
+        xml_content = MODELS_DIR / f"upload_{job_id}.xml"
+        try:
+            upload.save(xml_content)
+        except Exception as e:
+            xml_content.unlink(missing_ok=True)
+            logger.error(f"Upload error for shop {shop_id}: {e}")
+            return jsonify({'error': f'Could not save upload: {e}'}), 500
+    
+    with training_lock:
+        previous = training_jobs.get(shop_id)
+        if previous is not None and not previous.done():
+            response = jsonify({
+                'error': 'Training already in progress for this shop',
+                'shop_id': shop_id,
+                'job_id': training_status.get(shop_id, {}).get('job_id')
+            }), 409
+        elif sum(not job.done() for job in training_jobs.values()) >= TRAIN_QUEUE_SIZE:
+            response = jsonify({
+                'error': 'Training queue is full, retry later',
+                'shop_id': shop_id
+            }), 429
+        else:
+            response = None
+            previous_status = training_status.get(shop_id)
+            
+            # Set status to "training" (queued until a pool worker picks it up)
+            training_status[shop_id] = {
+                'status': 'training',
+                'job_id': job_id,
+                'started_at': time.time(),
+                'message': 'Training in progress...'
+            }
+            
+            try:
+                # Start training in the background pool
+                training_jobs[shop_id] = submit_training(shop_id, xml_content, job_id)
+            except Exception as e:
+                # Never leave the shop stuck in 'training'
+                if previous_status is None:
+                    training_status.pop(shop_id, None)
+                else:
+                    training_status[shop_id] = previous_status
+                logger.error(f"Could not start training for shop {shop_id}: {e}")
+                response = jsonify({'error': str(e), 'shop_id': shop_id}), 500
+    
+    if response is not None:
+        if isinstance(xml_content, Path):
+            xml_content.unlink(missing_ok=True)
+        return response
     
     logger.info(f"Training started in background for shop {shop_id}")
     
@@ -493,8 +1743,9 @@ def train():
         'success': True,
         'message': 'Training started in background',
         'shop_id': shop_id,
+        'job_id': job_id,
         'status': 'training'
-    })
+    }), 202
 
 @app.route('/training-status', methods=['GET'])
 def get_training_status():
@@ -503,8 +1754,10 @@ def get_training_status():
     
     Query params:
         shop_id (required): Shop identifier
+        wait (optional): Seconds to block until a running job finishes (max: 60)
     """
     shop_id = request.args.get('shop_id')
+    wait_seconds = min(float(request.args.get('wait', 0)), MAX_STATUS_WAIT)
     
     if not shop_id:
         return jsonify({'error': 'shop_id is required'}), 400
@@ -512,6 +1765,11 @@ def get_training_status():
     if not shop_id.isalnum():
         return jsonify({'error': 'Invalid shop_id'}), 400
     
+    # Long poll: block on the job's future instead of client-side sleep loops
+    job = training_jobs.get(shop_id)
+    if job is not None and wait_seconds > 0:
+        wait([job], timeout=wait_seconds)
+    
     status = training_status.get(shop_id, {
         'status': 'unknown',
         'message': 'No training records found'
@@ -547,15 +1805,20 @@ def status():
         })
     
     try:
-        with open(model_path, 'r') as f:
-            model_data = json.load(f)
+        # The model file changes on every retrain, so its stat identifies the response
+        st = model_path.stat()
+        etag = f"{shop_id}-{st.st_mtime_ns}-{st.st_size}"
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
-        return jsonify({
+        response = jsonify({
             'trained': True,
             'shop_id': shop_id,
-            'products_count': len(model_data['products']),
-            'trained_at': model_data['trained_at']
+            **read_model_info(model_path)
         })
+        response.set_etag(etag, weak=True)
+        return response
         
     except Exception as e:
         logger.error(f"Status endpoint error: {e}")
@@ -564,31 +1827,48 @@ def status():
 @app.route('/shops', methods=['GET'])
 def list_shops():
     """List all trained shops"""
-    shops = []
+    model_files = []
+    for model_file in sorted(MODELS_DIR.glob("shop_*.json")):
+        try:
+            st = model_file.stat()
+        except OSError:
+            continue
+        model_files.append((model_file, st))
+    
+    # Fingerprint of every model file: unchanged shops give an unchanged ETag
+    fingerprint = '|'.join(f"{path.name}:{st.st_mtime_ns}:{st.st_size}" for path, st in model_files)
+    etag = hashlib.blake2b(fingerprint.encode(), digest_size=16).hexdigest()
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     
-    for model_file in MODELS_DIR.glob("shop_*.json"):
+    shops = []
+    for model_file, _ in model_files:
         try:
             shop_id = model_file.stem.replace('shop_', '')
-            with open(model_file, 'r') as f:
-                model_data = json.load(f)
-            
             shops.append({
                 'shop_id': shop_id,
-                'products_count': len(model_data['products']),
-                'trained_at': model_data['trained_at']
+                **read_model_info(model_file)
             })
         except:
             continue
     
-    return jsonify({
+    response = jsonify({
         'shops': shops,
         'count': len(shops)
     })
+    response.set_etag(etag, weak=True)
+    return response
 
 # =============================================================================
 # Main
 # =============================================================================
 
 if __name__ == '__main__':
+    # Pack embeddings and load the shared model, ranking kernel and shops up front so the first search doesn't pay for it
+    pack_embeddings()
+    get_embedder()
+    warm_rank_kernel()
+    warm_models()
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=False)
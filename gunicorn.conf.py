@@ -0,0 +1,23 @@
+"""
+Gunicorn hooks for the Neural Search API
+Settings (workers, threads, bind) live in the Procfile
+"""
+
+
+def when_ready(server):
+    """
+    Pack embeddings and load shop models in the master before workers fork
+    (needs --preload). Only plain data is loaded here: no embedder, thread
+    pools or training pool, which are not fork-safe.
+    """
+    if server.cfg.preload_app:
+        import app
+        app.pack_embeddings()
+        app.warm_models()
+
+
+def post_worker_init(worker):
+    """Load the embedder and compile the ranking kernel in each worker once forked, before it serves requests"""
+    import app
+    app.get_embedder()
+    app.warm_rank_kernel()
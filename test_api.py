@@ -6,11 +6,21 @@ Run locally before deploying to Railway
 
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 API_URL = "http://localhost:8080"  # Change to Railway URL after deployment
 SHOP_ID = "test_shop"
 
+# One keep-alive session for all tests: connections (and TLS handshakes) are
+# reused, so timings reflect the server rather than connection setup.
+# Idempotent requests are retried twice on connection errors; POST is not.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.2))
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
 # Sample XML for testing
 SAMPLE_XML = """<?xml version="1.0" encoding="UTF-8"?>
 <products>
@@ -50,7 +60,7 @@ def test_health():
     """Test health endpoint"""
     print("\n1. Testing /health endpoint...")
     try:
-        response = requests.get(f"{API_URL}/health")
+        response = SESSION.get(f"{API_URL}/health")
         print(f"Status: {response.status_code}")
         print(f"Response: {json.dumps(response.json(), indent=2)}")
         return response.status_code == 200
@@ -62,7 +72,7 @@ def test_train():
     """Test training endpoint"""
     print(f"\n2. Testing /train endpoint for shop '{SHOP_ID}'...")
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{API_URL}/train",
             json={
                 "shop_id": SHOP_ID,
@@ -72,7 +82,18 @@ def test_train():
         print(f"Status: {response.status_code}")
         result = response.json()
         print(f"Response: {json.dumps(result, indent=2)}")
-        return result.get('success', False)
+        if not result.get('success', False):
+            return False
+        
+        # Training runs in the background: long-poll until it finishes
+        status = {'status': 'training'}
+        while status.get('status') == 'training':
+            status = SESSION.get(
+                f"{API_URL}/training-status",
+                params={"shop_id": SHOP_ID, "wait": 60}
+            ).json()
+        print(f"Training status: {json.dumps(status, indent=2)}")
+        return status.get('status') == 'completed'
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
@@ -81,7 +102,7 @@ def test_status():
     """Test status endpoint"""
     print(f"\n3. Testing /status endpoint for shop '{SHOP_ID}'...")
     try:
-        response = requests.get(f"{API_URL}/status", params={"shop_id": SHOP_ID})
+        response = SESSION.get(f"{API_URL}/status", params={"shop_id": SHOP_ID})
         print(f"Status: {response.status_code}")
         print(f"Response: {json.dumps(response.json(), indent=2)}")
         return response.status_code == 200
@@ -93,7 +114,7 @@ def test_search(query):
     """Test search endpoint"""
     print(f"\n4. Testing /search endpoint with query: '{query}'...")
     try:
-        response = requests.get(
+        response = SESSION.get(
             f"{API_URL}/search",
             params={
                 "shop_id": SHOP_ID,
@@ -123,7 +144,7 @@ def test_shops():
     """Test shops list endpoint"""
     print("\n5. Testing /shops endpoint...")
     try:
-        response = requests.get(f"{API_URL}/shops")
+        response = SESSION.get(f"{API_URL}/shops")
         print(f"Status: {response.status_code}")
         result = response.json()
         print(f"Response: {json.dumps(result, indent=2)}")